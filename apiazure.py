@@ -3,6 +3,10 @@ import requests
 import time
 import re
 import sys
+import json
+import fcntl
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # ENV VARS set from the pipeline
 clientId = os.getenv('clientId')
@@ -13,9 +17,64 @@ tenantId = os.getenv('tenantId')
 subscriptionId = os.getenv('subscriptionId')
 resource = "https://management.azure.com/.default"
 azureApiVersion = "2021-08-01"
+armBatchApiVersion = "2020-06-01"
 baseUrl = f"https://management.azure.com/subscriptions/{subscriptionId}/resourceGroups/{resourceGroupName}/providers/Microsoft.ApiManagement/service/{apimServiceName}"
 
+# Spec file names look like <api>-v<NNN>.yaml; group 1 is the version set name
+_SPEC_RE = re.compile(r"^([a-zA-Z0-9_]*)-v\d{0,3}\.yaml$")
+
+# Shared session so every call reuses the same keep-alive HTTPS connections
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_maxsize=16,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET", "PUT", "POST"],
+        respect_retry_after_header=True
+    )
+))
+
+# Cached OAuth token, refreshed only when close to expiry
+_TOKEN_CACHE = {"token": None, "exp": 0.0}
+
+# On-disk cache shared with other scripts in the same pipeline run
+tokenCacheFile = os.path.join(os.getenv('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'apim-token.json')
+
+def readTokenCache():
+    # Returns a cached {token, exp} dict if it is still valid, else None
+    try:
+        with open(tokenCacheFile) as f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            cached = json.load(f)
+        if cached.get("token") and time.time() < cached.get("exp", 0) - 60:
+            return cached
+    except (OSError, ValueError):
+        pass
+    return None
+
+def writeTokenCache(token, exp):
+    try:
+        os.makedirs(os.path.dirname(tokenCacheFile), exist_ok=True)
+        with open(tokenCacheFile, 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            json.dump({"token": token, "exp": exp}, f)
+        os.chmod(tokenCacheFile, 0o600)
+    except OSError:
+        pass
+
 def getToken():
+    # Reuse the cached token unless it expires within the next 60 seconds
+    if _TOKEN_CACHE["token"] and time.time() < _TOKEN_CACHE["exp"] - 60:
+        return _TOKEN_CACHE["token"]
+
+    # Another script in this pipeline may already have authenticated
+    cached = readTokenCache()
+    if cached:
+        _TOKEN_CACHE.update(cached)
+        return _TOKEN_CACHE["token"]
+
     url = f"https://login.microsoftonline.com/{tenantId}/oauth2/v2.0/token"
     data = {
         "client_id": clientId,
@@ -24,36 +83,67 @@ def getToken():
         "scope": resource
     }
 
-    r = requests.post(url, data=data)
+    try:
+        r = SESSION.post(url, data=data)
+    except requests.RequestException as e:
+        print(f"Error requesting token: {e}")
+        sys.exit(1)
     if r.status_code == 200:
-        return r.json()['access_token']
+        body = r.json()
+        _TOKEN_CACHE["token"] = body['access_token']
+        _TOKEN_CACHE["exp"] = time.time() + body.get('expires_in', 3600)
+        writeTokenCache(_TOKEN_CACHE["token"], _TOKEN_CACHE["exp"])
+        return _TOKEN_CACHE["token"]
     else:
         print(r.status_code)
         print(r.text)
         sys.exit(1)
 
-def createOrUpdateVersionSet(apiPath):
-    token = getToken()
-    url = f"{baseUrl}/apiVersionSets/{apiPath}"
-    params = {'api-version': azureApiVersion}
-    headers = {'Authorization': 'Bearer ' + token, 'Content-Type': 'application/json', 'If-Match': '*'}
-    data = {'properties': {"displayName": apiPath, "versioningScheme": "Header", "versionHeaderName": "X-API-VERSION"}}
+def createOrUpdateVersionSetsBatch(apiPaths, token):
+    # ARM accepts up to 20 sub-requests per $batch call, so one POST
+    # covers a whole chunk of version sets instead of one PUT each
+    url = "https://management.azure.com/batch"
+    params = {'api-version': armBatchApiVersion}
+    headers = {'Authorization': 'Bearer ' + token, 'Content-Type': 'application/json'}
+
+    apiPaths = list(apiPaths)
+    for i in range(0, len(apiPaths), 20):
+        chunk = apiPaths[i:i + 20]
+        data = {'requests': [
+            {
+                'httpMethod': 'PUT',
+                'url': f"{baseUrl}/apiVersionSets/{apiPath}?api-version={azureApiVersion}",
+                'headers': {'If-Match': '*'},
+                'content': {'properties': {"displayName": apiPath, "versioningScheme": "Header", "versionHeaderName": "X-API-VERSION"}}
+            }
+            for apiPath in chunk
+        ]}
+
+        # Exhausted retries raise rather than return a response; treat
+        # that like a failed chunk and keep going with the rest
+        try:
+            r = SESSION.post(url=url, params=params, headers=headers, json=data)
+        except requests.RequestException as e:
+            print(f"Error sending version set batch: {e}")
+            continue
+        if r.status_code != 200:
+            print(f"{r.status_code} Error sending version set batch")
+            print(r.text)
+            continue
 
-    r = requests.put(url=url, params=params, headers=headers, json=data)
-    if r.status_code in (200, 201):
-        print(f"{r.status_code} Created Version Set {apiPath}")
-    else: 
-        print(f"{r.status_code} Error creating Version Set {apiPath}")
+        for apiPath, response in zip(chunk, r.json().get('responses', [])):
+            status = response.get('httpStatusCode')
+            if status in (200, 201):
+                print(f"{status} Created Version Set {apiPath}")
+            else:
+                print(f"{status} Error creating Version Set {apiPath}")
 
 def main():
-    regex = re.compile("^([a-zA-Z0-9_]*)-(v\d{0,3})\.yaml$")
-    files = os.listdir('./openapi/')
-    files = [file for file in files if regex.match(file)]
-    if files:
+    matches = [m for m in map(_SPEC_RE.match, os.listdir('./openapi/')) if m]
+    if matches:
         print("Checking Version Sets...")
-        vSets = set(re.split('-|\.', file)[0] for file in files)
-        for vSet in vSets:
-            createOrUpdateVersionSet(vSet)
+        vSets = set(m.group(1) for m in matches)
+        createOrUpdateVersionSetsBatch(vSets, getToken())
     else:
         print("Didn't find any spec files, exiting")
         sys.exit(1)
@@ -9,10 +9,37 @@ from pathlib import Path
 import tempfile
 import subprocess
 
+# Prefer the libyaml C loader and orjson when available; both parse
+# large specs several times faster than the pure-Python equivalents
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logging.basicConfig(level=logging.INFO, 
                     format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('api-validator')
 
+# Matches {param} placeholders in path templates
+_PATH_PARAM_RE = re.compile(r'{([^}]+)}')
+
+# HTTP methods the checks care about, in the order findings report them
+_METHODS = ('get', 'post', 'put', 'delete', 'patch')
+
+# Content types that APIM handles well; frozenset for O(1) membership
+_SUPPORTED_TYPES = frozenset({
+    'application/json',
+    'application/xml',
+    'text/plain',
+    'multipart/form-data',
+    'application/x-www-form-urlencoded'
+})
+
 class ApiValidator:
     def __init__(self, spec_path):
         self.spec_path = spec_path
@@ -21,12 +48,16 @@ class ApiValidator:
         
         # Load the specification
         try:
-            with open(spec_path, 'r') as f:
-                content = f.read()
+            # Read bytes; both parsers accept them and we skip the decode
+            with open(spec_path, 'rb') as f:
                 if spec_path.endswith('.json'):
-                    self.spec = json.loads(content)
+                    content = f.read()
+                    self.spec = orjson.loads(content) if orjson else json.loads(content)
                 else:  # Assume YAML
-                    self.spec = yaml.safe_load(content)
+                    # Hand the parser the stream itself: libyaml reads it
+                    # incrementally, so a multi-MB document is never held
+                    # in memory alongside the parsed tree
+                    self.spec = yaml.load(f, Loader=SafeLoader)
         except Exception as e:
             self.errors.append(f"Failed to load specification: {str(e)}")
             self.spec = None
@@ -35,84 +66,81 @@ class ApiValidator:
         """Run all validation checks"""
         if not self.spec:
             return False
-        
-        # Core validation checks
-        self.check_operation_ids()
-        self.check_path_parameters()
+
+        # Per-operation checks share a single walk over paths; the
+        # document-level checks run separately
+        if not self.spec.get('paths'):
+            self.errors.append("No paths defined in specification")
+        else:
+            self.check_paths()
         self.check_security_definitions()
-        self.check_content_types()
-        self.check_path_trailing_slashes()
         self.check_servers()
-        self.check_response_definitions()
         self.check_ref_siblings()
-        
+
         return len(self.errors) == 0
-    
-    def check_operation_ids(self):
-        """Verify all operations have unique operationIds"""
-        if not self.spec.get('paths'):
-            self.errors.append("No paths defined in specification")
-            return
-        
+
+    def check_paths(self):
+        """Single pass over paths fusing all per-operation checks"""
         operation_ids = {}
-        
+
         for path, path_item in self.spec['paths'].items():
-            for method in ['get', 'post', 'put', 'delete', 'patch']:
+            # Trailing slashes may cause issues in APIM
+            if path != '/' and path.endswith('/'):
+                self.errors.append(f"Path '{path}' ends with a trailing slash, which may cause issues in APIM")
+
+            # Computed once per path instead of once per method
+            path_params = _PATH_PARAM_RE.findall(path)
+            item_params = path_item.get('parameters', ())
+
+            for method in _METHODS:
                 if method not in path_item:
                     continue
-                    
                 operation = path_item[method]
-                if 'operationId' not in operation:
-                    self.errors.append(f"Missing operationId in {method.upper()} {path}")
-                else:
-                    op_id = operation['operationId']
-                    if op_id in operation_ids:
-                        self.errors.append(f"Duplicate operationId '{op_id}' found in {method.upper()} {path} and {operation_ids[op_id]}")
-                    else:
-                        operation_ids[op_id] = f"{method.upper()} {path}"
-    
-    def check_path_parameters(self):
+                self.check_operation_id(path, method, operation, operation_ids)
+                self.check_path_parameters(path, method, operation, path_params, item_params)
+                self.check_content_types(path, method, operation)
+                self.check_response_definitions(path, method, operation)
+
+    def check_operation_id(self, path, method, operation, operation_ids):
+        """Verify the operation has a unique operationId"""
+        if 'operationId' not in operation:
+            self.errors.append(f"Missing operationId in {method.upper()} {path}")
+        else:
+            op_id = operation['operationId']
+            if op_id in operation_ids:
+                self.errors.append(f"Duplicate operationId '{op_id}' found in {method.upper()} {path} and {operation_ids[op_id]}")
+            else:
+                operation_ids[op_id] = f"{method.upper()} {path}"
+
+    def check_path_parameters(self, path, method, operation, path_params, item_params):
         """Verify path parameters are properly defined"""
-        if not self.spec.get('paths'):
-            return
-            
-        for path, path_item in self.spec['paths'].items():
-            # Find parameters in path template
-            path_params = re.findall(r'{([^}]+)}', path)
-            
-            for method in ['get', 'post', 'put', 'delete', 'patch']:
-                if method not in path_item:
-                    continue
-                
-                operation = path_item[method]
-                operation_params = []
-                
-                # Check operation parameters
-                if 'parameters' in operation:
-                    for param in operation.get('parameters', []):
-                        if param.get('in') == 'path':
-                            operation_params.append(param.get('name'))
-                            
-                            # Ensure required=true for path parameters
-                            if not param.get('required'):
-                                self.errors.append(f"Path parameter '{param.get('name')}' in {method.upper()} {path} must have required=true")
-                
-                # Check path item parameters
-                if 'parameters' in path_item:
-                    for param in path_item.get('parameters', []):
-                        if param.get('in') == 'path' and param.get('name') not in operation_params:
-                            operation_params.append(param.get('name'))
-                
-                # Verify all path template parameters are defined
-                for param_name in path_params:
-                    if param_name not in operation_params:
-                        self.errors.append(f"Path parameter '{{{param_name}}}' in {path} is not defined in {method.upper()} operation")
-                
-                # Verify no extra path parameters are defined
-                for param_name in operation_params:
-                    if param_name not in path_params:
-                        self.errors.append(f"Defined path parameter '{param_name}' in {method.upper()} {path} not found in path template")
-    
+        operation_params = []
+
+        # Check operation parameters
+        if 'parameters' in operation:
+            for param in operation.get('parameters', []):
+                if param.get('in') == 'path':
+                    operation_params.append(param.get('name'))
+
+                    # Ensure required=true for path parameters
+                    if not param.get('required'):
+                        self.errors.append(f"Path parameter '{param.get('name')}' in {method.upper()} {path} must have required=true")
+
+        # Check path item parameters
+        for param in item_params:
+            if param.get('in') == 'path' and param.get('name') not in operation_params:
+                operation_params.append(param.get('name'))
+
+        # Verify all path template parameters are defined
+        for param_name in path_params:
+            if param_name not in operation_params:
+                self.errors.append(f"Path parameter '{{{param_name}}}' in {path} is not defined in {method.upper()} operation")
+
+        # Verify no extra path parameters are defined
+        for param_name in operation_params:
+            if param_name not in path_params:
+                self.errors.append(f"Defined path parameter '{param_name}' in {method.upper()} {path} not found in path template")
+
     def check_security_definitions(self):
         """Check security definitions for potential APIM issues"""
         if not self.spec.get('components') or not self.spec['components'].get('securitySchemes'):
@@ -134,49 +162,22 @@ class ApiValidator:
                     if flow.get('scopes') and len(flow['scopes']) > 10:
                         self.warnings.append(f"Large number of scopes in OAuth2 flow '{flow_name}' may cause issues in APIM")
     
-    def check_content_types(self):
+    def check_content_types(self, path, method, operation):
         """Check for potentially problematic content types"""
-        supported_types = [
-            'application/json', 
-            'application/xml', 
-            'text/plain', 
-            'multipart/form-data', 
-            'application/x-www-form-urlencoded'
-        ]
-        
-        if not self.spec.get('paths'):
-            return
-            
-        for path, path_item in self.spec['paths'].items():
-            for method in ['get', 'post', 'put', 'delete', 'patch']:
-                if method not in path_item:
-                    continue
-                    
-                operation = path_item[method]
-                
-                # Check request body content types
-                if 'requestBody' in operation and 'content' in operation['requestBody']:
-                    for content_type in operation['requestBody']['content'].keys():
-                        if content_type not in supported_types:
-                            self.warnings.append(f"Content type '{content_type}' in {method.upper()} {path} request body may not be well supported in APIM")
-                
-                # Check response content types
-                if 'responses' in operation:
-                    for status, response in operation['responses'].items():
-                        if 'content' in response:
-                            for content_type in response['content'].keys():
-                                if content_type not in supported_types:
-                                    self.warnings.append(f"Content type '{content_type}' in {method.upper()} {path} response may not be well supported in APIM")
-    
-    def check_path_trailing_slashes(self):
-        """Check for trailing slashes in paths"""
-        if not self.spec.get('paths'):
-            return
-            
-        for path in self.spec['paths'].keys():
-            if path != '/' and path.endswith('/'):
-                self.errors.append(f"Path '{path}' ends with a trailing slash, which may cause issues in APIM")
-    
+        # Check request body content types
+        if 'requestBody' in operation and 'content' in operation['requestBody']:
+            for content_type in operation['requestBody']['content'].keys():
+                if content_type not in _SUPPORTED_TYPES:
+                    self.warnings.append(f"Content type '{content_type}' in {method.upper()} {path} request body may not be well supported in APIM")
+
+        # Check response content types
+        if 'responses' in operation:
+            for status, response in operation['responses'].items():
+                if 'content' in response:
+                    for content_type in response['content'].keys():
+                        if content_type not in _SUPPORTED_TYPES:
+                            self.warnings.append(f"Content type '{content_type}' in {method.upper()} {path} response may not be well supported in APIM")
+
     def check_servers(self):
         """Check for server information"""
         # For OpenAPI 3.0
@@ -187,74 +188,60 @@ class ApiValidator:
         if self.spec.get('swagger', '').startswith('2.') and not (self.spec.get('host') or self.spec.get('basePath')):
             self.errors.append("No host or basePath defined in Swagger 2.0 specification")
     
-    def check_response_definitions(self):
-        """Check that operations have at least one success response"""
-        if not self.spec.get('paths'):
+    def check_response_definitions(self, path, method, operation):
+        """Check that the operation has at least one success response"""
+        if 'responses' not in operation:
+            self.errors.append(f"No responses defined for {method.upper()} {path}")
             return
-            
-        for path, path_item in self.spec['paths'].items():
-            for method in ['get', 'post', 'put', 'delete', 'patch']:
-                if method not in path_item:
-                    continue
-                    
-                operation = path_item[method]
-                
-                if 'responses' not in operation:
-                    self.errors.append(f"No responses defined for {method.upper()} {path}")
-                    continue
-                    
-                has_success = False
-                for status in operation['responses'].keys():
-                    if status.startswith('2') or status.startswith('3'):
-                        has_success = True
-                        
-                        # Check for empty response definition
-                        response = operation['responses'][status]
-                        if not response or (isinstance(response, dict) and not response.get('description')):
-                            self.errors.append(f"Empty success response definition for {method.upper()} {path} with status {status}")
-                        
-                if not has_success:
-                    self.errors.append(f"No success response (2xx, 3xx) defined for {method.upper()} {path}")
+
+        has_success = False
+        for status in operation['responses'].keys():
+            if status.startswith('2') or status.startswith('3'):
+                has_success = True
+
+                # Check for empty response definition
+                response = operation['responses'][status]
+                if not response or (isinstance(response, dict) and not response.get('description')):
+                    self.errors.append(f"Empty success response definition for {method.upper()} {path} with status {status}")
+
+        if not has_success:
+            self.errors.append(f"No success response (2xx, 3xx) defined for {method.upper()} {path}")
     
     def check_ref_siblings(self):
         """Check for $ref with siblings which APIM doesn't allow"""
-        def check_object(obj, path="root"):
-            if isinstance(obj, dict):
-                if '$ref' in obj and len(obj.keys()) > 1:
-                    self.errors.append(f"Object at {path} has $ref with siblings, which APIM doesn't support")
-                
+        # Explicit stack instead of recursion: deep specs would blow the
+        # recursion limit, and we only build a path string when an error
+        # is actually reported. Each stack entry carries a (parent, segment)
+        # chain; dict keys are stored as str, list indices as int.
+        # Exact type checks are safe (the parsers only produce plain
+        # dict/list) and scalar leaves never reach the stack, so the
+        # loop allocates one tuple per container instead of per node
+        stack = [(self.spec, None)] if type(self.spec) in (dict, list) else []
+        while stack:
+            obj, trail = stack.pop()
+            if type(obj) is dict:
+                if '$ref' in obj and len(obj) > 1:
+                    self.errors.append(f"Object at {self._trail_to_path(trail)} has $ref with siblings, which APIM doesn't support")
                 for key, value in obj.items():
-                    check_object(value, f"{path}.{key}")
-            elif isinstance(obj, list):
+                    if type(value) in (dict, list):
+                        stack.append((value, (trail, key)))
+            else:
                 for i, item in enumerate(obj):
-                    check_object(item, f"{path}[{i}]")
-        
-        check_object(self.spec)
-    
-    def run_spectral(self):
-        """Run Spectral for additional validation if available"""
-        try:
-            # Check if spectral is installed
-            result = subprocess.run(['spectral', '--version'], 
-                                  capture_output=True, 
-                                  text=True)
-            
-            # Run spectral against the spec
-            result = subprocess.run(['spectral', 'lint', self.spec_path], 
-                                  capture_output=True, 
-                                  text=True)
-            
-            if result.returncode != 0:
-                for line in result.stdout.splitlines():
-                    if 'error' in line.lower():
-                        self.errors.append(f"Spectral: {line.strip()}")
-                    elif 'warning' in line.lower():
-                        self.warnings.append(f"Spectral: {line.strip()}")
-                        
-            return True
-        except Exception as e:
-            logger.warning(f"Spectral validation not available: {str(e)}")
-            return False
+                    if type(item) in (dict, list):
+                        stack.append((item, (trail, i)))
+
+    @staticmethod
+    def _trail_to_path(trail):
+        """Rebuild a dotted path like root.paths./pet[0] from a trail chain"""
+        segments = []
+        while trail is not None:
+            trail, segment = trail
+            if isinstance(segment, int):
+                segments.append(f"[{segment}]")
+            else:
+                segments.append(f".{segment}")
+        segments.append("root")
+        return ''.join(reversed(segments))
     
     def report(self):
         """Generate a validation report"""
@@ -275,6 +262,44 @@ class ApiValidator:
         return len(self.errors) == 0
 
 
+def run_spectral(spec_paths):
+    """Run Spectral once over all specs and demux the results per file.
+
+    A single invocation pays the Node.js startup and ruleset parse once
+    instead of once per spec. Returns {abs_path: (errors, warnings)};
+    empty dict if Spectral is not available.
+    """
+    results = {os.path.abspath(p): ([], []) for p in spec_paths}
+
+    try:
+        result = subprocess.run(['spectral', 'lint', '--format', 'json', *spec_paths],
+                                capture_output=True,
+                                text=True)
+    except Exception as e:
+        logger.warning(f"Spectral validation not available: {str(e)}")
+        return {}
+
+    try:
+        findings = json.loads(result.stdout or '[]')
+    except json.JSONDecodeError:
+        logger.warning("Could not parse Spectral output")
+        return {}
+
+    for finding in findings:
+        source = os.path.abspath(finding.get('source', ''))
+        if source not in results:
+            continue
+        errors, warnings = results[source]
+        line = finding.get('range', {}).get('start', {}).get('line', 0) + 1
+        message = f"Spectral: line {line}: {finding.get('code')} - {finding.get('message')}"
+        if finding.get('severity') == 0:
+            errors.append(message)
+        else:
+            warnings.append(message)
+
+    return results
+
+
 def validate_and_save_spectral_ruleset():
     """Create .spectral.yaml file with APIM-specific rules"""
     spectral_content = """
@@ -395,18 +420,23 @@ def main():
     
     # Create spectral ruleset
     validate_and_save_spectral_ruleset()
-    
+
+    # Try to run spectral if available, once over all specs
+    spectral_results = run_spectral([str(p) for p in specs])
+
     # Validate each spec
     all_valid = True
     for spec_path in specs:
         validator = ApiValidator(str(spec_path))
-        
+
         # Run validation
-        is_valid = validator.validate()
-        
-        # Try to run spectral if available
-        validator.run_spectral()
-        
+        validator.validate()
+
+        # Merge in this spec's Spectral findings
+        errors, warnings = spectral_results.get(os.path.abspath(str(spec_path)), ((), ()))
+        validator.errors.extend(errors)
+        validator.warnings.extend(warnings)
+
         # Show report
         spec_valid = validator.report()
         all_valid = all_valid and spec_valid
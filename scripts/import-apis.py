@@ -1,16 +1,32 @@
 import os
 import sys
 import json
-import glob
-import tempfile
+import hashlib
 import subprocess
+import shutil
+import fcntl
+import base64
+import threading
 import time
 import yaml
 import requests
-from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import logging
 
+# Use the libyaml C loader when available (several times faster on big specs)
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+# orjson serializes large specs several times faster than stdlib json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -22,23 +38,57 @@ logger = logging.getLogger(__name__)
 RESOURCE_GROUP = os.environ.get("RESOURCE_GROUP")
 APIM_INSTANCE = os.environ.get("APIM_INSTANCE")
 SUBSCRIPTION_ID = os.environ.get("SUBSCRIPTION_ID")
-MAX_CONCURRENT = 4
+# Workers only do pooled keep-alive HTTP now (no az subprocesses), so a
+# much higher concurrency is safe against the ARM control plane
+MAX_CONCURRENT = int(os.environ.get("MAX_CONCURRENT", "16"))
 MAX_RETRIES = 3
 
 # Check if we need to run for all APIs or just changed APIs
 MODE = os.environ.get("MODE", "all")  # Default to 'all' if not specified
 
-# Azure API version
+# Azure API versions
 AZURE_API_VERSION = "2021-08-01"
+ARM_BATCH_API_VERSION = "2020-06-01"
+
+# ARM allows at most 20 sub-requests per $batch call
+BATCH_SIZE = 20
+
+# Polling cadence for imports that come back 202 (long-running operations)
+LRO_POLL_INTERVAL = 2
+LRO_POLL_TIMEOUT = 300
+
+# Base ARM URL for the APIM instance
+BASE_URL = f"https://management.azure.com/subscriptions/{SUBSCRIPTION_ID}/resourceGroups/{RESOURCE_GROUP}/providers/Microsoft.ApiManagement/service/{APIM_INSTANCE}"
+
+# Shared session so all workers reuse pooled keep-alive connections.
+# Transient failures retry in the adapter with capped exponential
+# backoff (1s, 2s, 4s) honoring Retry-After, instead of a worker thread
+# sleeping a fixed 10s while holding its pool slot.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=MAX_CONCURRENT,
+    pool_maxsize=MAX_CONCURRENT * 4,
+    max_retries=Retry(
+        total=MAX_RETRIES,
+        backoff_factor=1,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET", "PUT", "POST"],
+        respect_retry_after_header=True
+    )
+))
+
+
+# Resolved once so each az invocation skips the PATH search
+AZ_CLI = shutil.which("az") or "az"
 
 
 def run_command(cmd, capture_output=True):
-    """Run a shell command and return the result."""
+    """Run a command (argv list) and return the result."""
     logger.debug(f"Running command: {cmd}")
     try:
         result = subprocess.run(
             cmd,
-            shell=True,
+            shell=False,
             check=False,
             text=True,
             capture_output=capture_output
@@ -49,46 +99,123 @@ def run_command(cmd, capture_output=True):
         raise
 
 
+# Access token cached for the lifetime of the process, guarded by a lock
+# since any worker thread may trigger a refresh
+_TOKEN_CACHE = {"token": None, "exp": 0.0}
+_TOKEN_LOCK = threading.Lock()
+
+# On-disk cache shared with apiazure.py in the same pipeline run
+TOKEN_CACHE_FILE = os.path.join(os.getenv("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "apim-token.json")
+
+# Refresh tokens within five minutes of expiry; fall back to a
+# conservative lifetime when the expiry cannot be read from the token
+TOKEN_REFRESH_MARGIN = 300
+TOKEN_CACHE_TTL = 3000
+
+
+def token_expiry(token):
+    """Read the exp claim straight from the JWT payload; 0 if unreadable."""
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return json.loads(base64.urlsafe_b64decode(payload)).get("exp", 0)
+    except (IndexError, ValueError):
+        return 0
+
+
+def read_token_cache():
+    """Return a still-valid cached token from disk, or None."""
+    try:
+        with open(TOKEN_CACHE_FILE) as f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            cached = json.load(f)
+        if cached.get("token") and time.time() < cached.get("exp", 0) - TOKEN_REFRESH_MARGIN:
+            return cached["token"]
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def write_token_cache(token, exp):
+    """Persist the token for other scripts in this pipeline run."""
+    try:
+        os.makedirs(os.path.dirname(TOKEN_CACHE_FILE), exist_ok=True)
+        with open(TOKEN_CACHE_FILE, "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            json.dump({"token": token, "exp": exp}, f)
+        os.chmod(TOKEN_CACHE_FILE, 0o600)
+    except OSError:
+        pass
+
+
 def get_access_token():
-    """Get Azure access token using CLI."""
-    cmd = "az account get-access-token --resource=https://management.azure.com/ --query accessToken -o tsv"
-    result = run_command(cmd)
-    if result.returncode == 0:
-        return result.stdout.strip()
-    else:
-        logger.error(f"Failed to get access token: {result.stderr}")
-        sys.exit(1)
+    """Get Azure access token, preferring process and disk caches over the CLI."""
+    with _TOKEN_LOCK:
+        if _TOKEN_CACHE["token"] and time.time() < _TOKEN_CACHE["exp"] - TOKEN_REFRESH_MARGIN:
+            return _TOKEN_CACHE["token"]
 
+        cached = read_token_cache()
+        if cached:
+            _TOKEN_CACHE["token"] = cached
+            _TOKEN_CACHE["exp"] = token_expiry(cached)
+            return cached
 
-def check_version_set(api_path):
-    """Check if version set exists."""
-    logger.info(f"Checking if version set exists for {api_path}...")
-    cmd = (
-        f"az apim api versionset show "
-        f"--resource-group \"{RESOURCE_GROUP}\" "
-        f"--service-name \"{APIM_INSTANCE}\" "
-        f"--version-set-id \"{api_path}\" "
-        f"--output none"
-    )
-    result = run_command(cmd)
-    return result.returncode == 0
+        cmd = [AZ_CLI, "account", "get-access-token",
+               "--resource=https://management.azure.com/",
+               "--query", "accessToken", "-o", "tsv"]
+        result = run_command(cmd)
+        if result.returncode == 0:
+            token = result.stdout.strip()
+            exp = token_expiry(token) or time.time() + TOKEN_CACHE_TTL
+            _TOKEN_CACHE["token"] = token
+            _TOKEN_CACHE["exp"] = exp
+            write_token_cache(token, exp)
+            return token
+        else:
+            logger.error(f"Failed to get access token: {result.stderr}")
+            sys.exit(1)
 
 
-def create_version_set(api_path):
-    """Create API version set using direct REST API call."""
-    logger.info(f"Creating version set for {api_path} using REST API...")
-    
-    # Get access token
-    token = get_access_token()
-    
-    # Create version set using REST API
-    url = f"https://management.azure.com/subscriptions/{SUBSCRIPTION_ID}/resourceGroups/{RESOURCE_GROUP}/providers/Microsoft.ApiManagement/service/{APIM_INSTANCE}/apiVersionSets/{api_path}?api-version={AZURE_API_VERSION}"
-    
-    headers = {
-        "Authorization": f"Bearer {token}",
+def auth_headers():
+    """Standard headers for ARM REST calls."""
+    return {
+        "Authorization": f"Bearer {get_access_token()}",
         "Content-Type": "application/json"
     }
-    
+
+
+def list_version_sets():
+    """Return the names of all version sets on the instance.
+
+    One list call replaces a per-API round trip; pages via nextLink.
+    Returns None when the listing fails, in which case callers should
+    fall back to upserting unconditionally.
+    """
+    existing = set()
+    url = f"{BASE_URL}/apiVersionSets"
+    params = {"api-version": AZURE_API_VERSION}
+
+    while url:
+        try:
+            response = SESSION.get(url, params=params, headers=auth_headers())
+        except requests.RequestException as e:
+            logger.warning(f"Could not list version sets ({e}); will upsert all")
+            return None
+        if response.status_code != 200:
+            logger.warning(f"Could not list version sets ({response.status_code}); will upsert all")
+            return None
+        body = response.json()
+        existing.update(vs.get("name") for vs in body.get("value", []))
+        url = body.get("nextLink")
+        params = None  # nextLink already carries the query string
+
+    return existing
+
+
+def create_version_set(api_path):
+    """Create or update API version set using direct REST API call."""
+    logger.info(f"Creating version set for {api_path} using REST API...")
+
     data = {
         "properties": {
             "displayName": api_path,
@@ -96,9 +223,20 @@ def create_version_set(api_path):
             "versionHeaderName": "X-API-VERSION"
         }
     }
-    
-    response = requests.put(url, headers=headers, json=data)
-    
+
+    # The PUT is idempotent with If-Match: *, so there is no need for a
+    # separate existence check beforehand
+    try:
+        response = SESSION.put(
+            f"{BASE_URL}/apiVersionSets/{api_path}",
+            params={"api-version": AZURE_API_VERSION},
+            headers={**auth_headers(), "If-Match": "*"},
+            json=data
+        )
+    except requests.RequestException as e:
+        logger.error(f"Failed to create version set for {api_path}: {e}")
+        return False
+
     if response.status_code in (200, 201):
         logger.info(f"Successfully created version set for {api_path}")
         return True
@@ -107,194 +245,334 @@ def create_version_set(api_path):
         return False
 
 
-def update_api_version_info(api_id, api_version, version_set_id):
-    """Update API version information using direct REST API call."""
-    logger.info(f"Updating version info for {api_id} using REST API...")
-    
-    # Get access token
-    token = get_access_token()
-    
-    # Get current API details first
-    url = f"https://management.azure.com/subscriptions/{SUBSCRIPTION_ID}/resourceGroups/{RESOURCE_GROUP}/providers/Microsoft.ApiManagement/service/{APIM_INSTANCE}/apis/{api_id}?api-version={AZURE_API_VERSION}"
-    
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-    
-    # First get the current API to avoid overwriting existing settings
-    get_response = requests.get(url, headers=headers)
-    
-    if get_response.status_code != 200:
-        logger.error(f"Failed to get API details for {api_id}: {get_response.text}")
-        return False
-    
-    # Extract current properties
-    current_api = get_response.json()
-    
-    # Update with version info
-    update_data = current_api
-    update_data['properties']['apiVersion'] = api_version
-    update_data['properties']['apiVersionSetId'] = version_set_id
-    
-    # Update the API
-    update_response = requests.put(url, headers=headers, json=update_data)
-    
-    if update_response.status_code in (200, 201):
-        logger.info(f"Successfully updated version info for {api_id}")
-        return True
+# Sidecar cache of spec hashes from previous successful imports
+HASH_CACHE_DIR = "./.import-cache"
+
+
+def spec_digest(file):
+    """SHA-256 of the spec bytes (hashlib.file_digest when available)."""
+    with open(file, 'rb') as f:
+        if hasattr(hashlib, 'file_digest'):  # Python 3.11+
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def read_spec_hash(api_id):
+    """Return the hash recorded at the last successful import, or None."""
+    try:
+        with open(os.path.join(HASH_CACHE_DIR, f"{api_id}.sha256")) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def write_spec_hash(api_id, digest):
+    """Record the hash of a successfully imported spec."""
+    try:
+        os.makedirs(HASH_CACHE_DIR, exist_ok=True)
+        with open(os.path.join(HASH_CACHE_DIR, f"{api_id}.sha256"), 'w') as f:
+            f.write(digest)
+    except OSError:
+        pass
+
+
+def build_import_payload(api_path, version_set_id, spec_path):
+    """Build the PUT body that imports the spec and sets version info atomically.
+
+    The spec is parsed exactly once here; info.version comes from the
+    loaded dict. The YAML is converted to compact JSON: ARM accepts
+    openapi+json directly, and the JSON body is typically 20-40%
+    smaller than the raw YAML text (no comments, anchors, or
+    indentation) — a bandwidth win on multi-MB specs.
+    """
+    with open(spec_path, 'rb') as f:
+        spec = yaml.load(f, Loader=SafeLoader)
+
+    api_version = spec.get('info', {}).get('version') or '1.0'
+
+    if orjson:
+        spec_value = orjson.dumps(spec).decode()
     else:
-        logger.error(f"Failed to update version info for {api_id}: {update_response.text}")
-        return False
+        spec_value = json.dumps(spec, separators=(',', ':'))
 
+    return {
+        "properties": {
+            "format": "openapi+json",
+            "value": spec_value,
+            "path": api_path,
+            "type": "http",
+            "protocols": ["https"],
+            "apiVersion": api_version,
+            "apiVersionSetId": version_set_id
+        }
+    }
 
-def import_api(api_id, api_version, api_path, version_set_id, spec_path, result_file):
-    """Import API with version set."""
-    logger.info(f"Importing API {api_id} with version {api_version}...")
-    
-    # Try import with retry logic
-    retry_count = 0
-    success = False
-    
-    while retry_count < MAX_RETRIES and not success:
-        logger.info(f"Attempt {retry_count + 1} of {MAX_RETRIES}")
-        
-        # Use az apim api import command
-        import_cmd = (
-            f"az apim api import "
-            f"--resource-group \"{RESOURCE_GROUP}\" "
-            f"--service-name \"{APIM_INSTANCE}\" "
-            f"--path \"{api_path}\" "
-            f"--api-id \"{api_id}\" "
-            f"--specification-path \"{spec_path}\" "
-            f"--specification-format OpenApi "
-            f"--api-type http "
-            f"--protocols https"
-        )
-        
-        import_result = run_command(import_cmd)
-        
-        if import_result.returncode == 0:
-            success = True
-            logger.info(f"Successfully imported {api_id}")
-            
-            # Set API version and version set using REST API
-            if update_api_version_info(api_id, api_version, version_set_id):
-                with open(result_file, 'a') as f:
-                    f.write(json.dumps({api_id: 200}) + "\n")
+
+def import_apis_batch(entries):
+    """Import prepared APIs through the ARM $batch endpoint.
+
+    entries is a list of (api_id, payload) pairs. ARM accepts up to 20
+    sub-requests per batch call, so one POST covers a whole chunk of
+    imports. Returns an {api_id: status} dict for the summary.
+    """
+    results = {}
+    pending = []
+
+    for i in range(0, len(entries), BATCH_SIZE):
+        chunk = entries[i:i + BATCH_SIZE]
+        batch_body = {
+            "requests": [
+                {
+                    "httpMethod": "PUT",
+                    "url": f"{BASE_URL}/apis/{api_id}?api-version={AZURE_API_VERSION}",
+                    "content": payload
+                }
+                for api_id, payload in chunk
+            ]
+        }
+
+        logger.info(f"Importing batch of {len(chunk)} APIs")
+
+        # Retries with backoff happen inside the session adapter
+        try:
+            response = SESSION.post(
+                "https://management.azure.com/batch",
+                params={"api-version": ARM_BATCH_API_VERSION},
+                headers=auth_headers(),
+                json=batch_body
+            )
+        except requests.RequestException as e:
+            logger.error(f"Batch import failed after retries: {e}")
+            results.update({api_id: 500 for api_id, _ in chunk})
+            continue
+
+        if response.status_code != 200:
+            logger.error(f"Batch import failed: {response.text}")
+            results.update({api_id: 500 for api_id, _ in chunk})
+            continue
+
+        for (api_id, _), sub_response in zip(chunk, response.json().get("responses", [])):
+            status = sub_response.get("httpStatusCode")
+            if status in (200, 201):
+                logger.info(f"Successfully imported {api_id}")
+                results[api_id] = 200
+            elif status == 202:
+                # Long-running operation: note where to poll and move on,
+                # so Azure works on all accepted imports in parallel.
+                # Azure-AsyncOperation URLs report the outcome in the
+                # response body, so remember which kind we are polling
+                headers = {k.lower(): v for k, v in sub_response.get("headers", {}).items()}
+                if headers.get("location"):
+                    pending.append((api_id, headers["location"], False))
+                elif headers.get("azure-asyncoperation"):
+                    pending.append((api_id, headers["azure-asyncoperation"], True))
+                else:
+                    # Nothing to poll, so the outcome cannot be confirmed;
+                    # report the 202 as-is rather than assuming success
+                    logger.warning(f"Import of {api_id} accepted but returned no operation URL to poll")
+                    results[api_id] = 202
             else:
-                with open(result_file, 'a') as f:
-                    f.write(json.dumps({api_id: 500}) + "\n")
-        else:
-            retry_count += 1
-            if retry_count < MAX_RETRIES:
-                logger.warning(f"Import failed, retrying in 10 seconds... Error: {import_result.stderr}")
-                time.sleep(10)
+                logger.error(f"Failed to import {api_id}: status {status}")
+                results[api_id] = status or 500
+
+    # Everything has been submitted; now reap the outstanding operations
+    if pending:
+        logger.info(f"Waiting for {len(pending)} long-running imports to complete...")
+        results.update(poll_pending_imports(pending))
+
+    return results
+
+
+def poll_pending_imports(pending):
+    """Poll accepted imports until they reach a terminal state.
+
+    pending is a list of (api_id, poll_url, is_async_op) triples, where
+    is_async_op marks URLs from the Azure-AsyncOperation header, which
+    answer 200 with the outcome in the body's status field rather than
+    via the HTTP status. Sweeping all outstanding operations in one
+    loop decouples submission from completion: Azure processes the
+    imports concurrently while a single thread shepherds them. Returns
+    an {api_id: status} dict.
+    """
+    results = {}
+    deadline = time.time() + LRO_POLL_TIMEOUT
+
+    while pending and time.time() < deadline:
+        still_pending = []
+        for api_id, poll_url, is_async_op in pending:
+            try:
+                response = SESSION.get(poll_url, headers=auth_headers())
+            except requests.RequestException as e:
+                logger.error(f"Polling import of {api_id} failed: {e}")
+                results[api_id] = 500
+                continue
+
+            if response.status_code == 202:
+                still_pending.append((api_id, poll_url, is_async_op))
+            elif response.status_code in (200, 201):
+                if is_async_op:
+                    try:
+                        op_status = response.json().get("status", "")
+                    except ValueError:
+                        op_status = ""
+                    if op_status == "Succeeded":
+                        logger.info(f"Successfully imported {api_id}")
+                        results[api_id] = 200
+                    elif op_status in ("Failed", "Canceled"):
+                        logger.error(f"Import of {api_id} {op_status.lower()}: {response.text}")
+                        results[api_id] = 500
+                    else:
+                        # InProgress/Running (or an unreadable body):
+                        # the operation has not reached a terminal state
+                        still_pending.append((api_id, poll_url, is_async_op))
+                else:
+                    logger.info(f"Successfully imported {api_id}")
+                    results[api_id] = 200
             else:
-                logger.error(f"Failed to import {api_id} after {MAX_RETRIES} attempts: {import_result.stderr}")
-                with open(result_file, 'a') as f:
-                    f.write(json.dumps({api_id: 400}) + "\n")
+                logger.error(f"Import of {api_id} failed: status {response.status_code}")
+                results[api_id] = response.status_code
+
+        pending = still_pending
+        if pending:
+            time.sleep(LRO_POLL_INTERVAL)
+
+    for api_id, _, _ in pending:
+        logger.error(f"Import of {api_id} did not complete within {LRO_POLL_TIMEOUT}s")
+        results[api_id] = 202
+
+    return results
+
 
+def process_api_file(file):
+    """Parse a single API file and build its import payload.
 
-def process_api_file(file, result_file):
-    """Process a single API file."""
+    Purely CPU and local I/O (hashing, YAML parse, JSON serialization)
+    so it can run in a process pool; the network work — version-set
+    upserts and the batched imports — happens afterwards in main().
+    Returns an (api_id, status, payload, digest) tuple: payload and
+    digest are set when an import is needed, otherwise status carries
+    the outcome (304 for unchanged specs, 500 for failures).
+    """
     # Extract file name without path and extension
     filename = os.path.basename(file)
     base_name = os.path.splitext(filename)[0]
-    
-    # Get info from YAML file
+
     try:
-        with open(file, 'r') as f:
-            api_spec = yaml.safe_load(f)
-        
-        service_url = api_spec.get('servers', [{}])[0].get('url', '')
-        version_id = api_spec.get('info', {}).get('version', '1.0')
-        display_name = f"{base_name}-{version_id}"
-        
-        # Get API name from the file name or directory structure
-        api_name = base_name
-        api_id = api_name
-        api_path = api_name
+        # API name, id and path all come from the file name
+        api_id = base_name
+        api_path = base_name
         version_set_id = f"/subscriptions/{SUBSCRIPTION_ID}/resourceGroups/{RESOURCE_GROUP}/providers/Microsoft.ApiManagement/service/{APIM_INSTANCE}/apiVersionSets/{api_path}"
-        
-        logger.info(f"Processing API: {api_name} (version {version_id})")
-        
-        # Check and create version set if needed
-        if not check_version_set(api_path):
-            if not create_version_set(api_path):
-                logger.error(f"Failed to create version set for {api_path}, skipping API import")
-                with open(result_file, 'a') as f:
-                    f.write(json.dumps({api_id: 500}) + "\n")
-                return
-        
-        # Import API
-        import_api(api_id, version_id, api_path, version_set_id, file, result_file)
-        
+
+        # Hash first: unchanged specs skip the ARM work without being
+        # parsed at all
+        digest = spec_digest(file)
+        if read_spec_hash(api_id) == digest:
+            logger.info(f"Spec for {api_id} unchanged since last import, skipping")
+            return api_id, 304, None, None
+
+        logger.info(f"Processing API: {api_id}")
+        return api_id, None, build_import_payload(api_path, version_set_id, file), digest
+
     except Exception as e:
         logger.error(f"Error processing API file {file}: {e}")
-        with open(result_file, 'a') as f:
-            f.write(json.dumps({base_name: 500}) + "\n")
+        return base_name, 500, None, None
+
+
+def find_api_files(root):
+    """Yield .yaml files under root via scandir.
+
+    scandir exposes the entry type from the directory listing itself, so
+    no extra stat syscall is paid per file the way glob + isfile does.
+    """
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        # Skip hidden directories (.git and the like)
+                        if not entry.name.startswith('.'):
+                            stack.append(entry.path)
+                    elif entry.name.endswith(".yaml") and entry.is_file(follow_symlinks=False):
+                        yield entry.path
+        except OSError as e:
+            logger.warning(f"Could not scan {directory}: {e}")
 
 
 def main():
     """Main execution function."""
-    # Create temp directory for results
-    temp_dir = tempfile.mkdtemp()
-    result_file = os.path.join(temp_dir, "results.json")
-    
     # Find API files
     if MODE == "all":
         # Process all yaml files in the apis directory (including subdirectories)
         logger.info("Processing all API files...")
-        api_files = glob.glob("./apis/**/*.yaml", recursive=True)
+        api_files = list(find_api_files("./apis"))
     else:
         # Process only changed files from the last commit
         logger.info("Processing changed API files from the last commit...")
-        changed_files_cmd = "git diff-tree --no-commit-id --name-only -r HEAD"
+        changed_files_cmd = ["git", "diff-tree", "--no-commit-id", "--name-only", "-r", "HEAD"]
         result = run_command(changed_files_cmd)
         changed_files = result.stdout.strip().split('\n')
-        api_files = [f for f in changed_files if f.startswith("apis/") and f.endswith(".yaml")]
-    
+        # The diff can list deleted files, so keep the existence check here
+        api_files = [f for f in changed_files
+                     if f.startswith("apis/") and f.endswith(".yaml") and os.path.isfile(f)]
+
     if not api_files:
         logger.info("No API files found to process.")
         return 0
     
-    # Process API files in parallel
     logger.info(f"Processing {len(api_files)} API imports (concurrency: {MAX_CONCURRENT})...")
-    
-    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT) as executor:
-        futures = []
-        for file in api_files:
-            if os.path.isfile(file):
-                futures.append(executor.submit(process_api_file, file, result_file))
-        
-        # Wait for all tasks to complete
-        for future in futures:
-            try:
-                future.result()
-            except Exception as e:
-                logger.error(f"Error in worker thread: {e}")
-    
+
+    # One listing up front saves a round trip per already-known version set
+    existing_version_sets = list_version_sets()
+
+    # Stage 1: parse and serialize specs in a process pool. The parse is
+    # CPU-bound, so threads would serialize it behind the GIL; chunking
+    # amortizes the per-task IPC without starving workers on small runs
+    results = {}
+    prepared = []
+    chunksize = max(1, len(api_files) // ((os.cpu_count() or 1) * 4))
+    with ProcessPoolExecutor() as pool:
+        for api_id, status, payload, digest in pool.map(process_api_file, api_files, chunksize=chunksize):
+            if payload is None:
+                results[api_id] = status
+            else:
+                prepared.append((api_id, payload, digest))
+
+    # Stage 2: network. Upsert any missing version sets concurrently
+    # (threads are fine here, the work is pure I/O), then send the
+    # prepared imports in batches of up to BATCH_SIZE
+    if prepared:
+        needed = sorted({api_id for api_id, _, _ in prepared} - (existing_version_sets or set()))
+        failed_sets = set()
+        if needed:
+            with ThreadPoolExecutor(max_workers=MAX_CONCURRENT) as executor:
+                for api_path, ok in zip(needed, executor.map(create_version_set, needed)):
+                    if not ok:
+                        logger.error(f"Failed to create version set for {api_path}, skipping API import")
+                        failed_sets.add(api_path)
+        if failed_sets:
+            results.update({api_id: 500 for api_id, _, _ in prepared if api_id in failed_sets})
+            prepared = [entry for entry in prepared if entry[0] not in failed_sets]
+
+    if prepared:
+        batch_results = import_apis_batch([(api_id, payload) for api_id, payload, _ in prepared])
+        results.update(batch_results)
+
+        # Remember what was imported so unchanged specs are skipped next run
+        for api_id, _, digest in prepared:
+            if batch_results.get(api_id) == 200:
+                write_spec_hash(api_id, digest)
+
     logger.info("All API imports have completed.")
-    logger.info(f"Results saved to: {result_file}")
-    
+
     # Display summary of results
     logger.info("Summary of import results:")
-    try:
-        results = {}
-        with open(result_file, 'r') as f:
-            for line in f:
-                try:
-                    result_dict = json.loads(line)
-                    results.update(result_dict)
-                except json.JSONDecodeError:
-                    pass
-        
+    if orjson is not None:
+        print(orjson.dumps(results, option=orjson.OPT_INDENT_2).decode())
+    else:
         print(json.dumps(results, indent=2))
-    except Exception as e:
-        logger.error(f"Error reading results: {e}")
-        print("No results recorded.")
-    
+
     return 0
 
 